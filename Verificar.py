@@ -1,43 +1,270 @@
+import hashlib
+import multiprocessing
 import os
 import re
-from typing import List, Tuple
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+import numpy as np
 from PIL import Image
 import pytesseract
 
+try:
+    # Opcional: API de Tesseract en el mismo proceso (sin lanzar tesseract.exe).
+    # Usa la libtesseract y el tessdata con los que se instaló tesserocr, no tesseract_cmd
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+OCR_BACKEND = "tesserocr" if PyTessBaseAPI is not None else "tesseract"
+
 # ========== CONFIGURACIÓN ==========
 pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
 IMAGE_DIR = "images"  # Carpeta con facturas (png, jpg, jpeg)
+OCR_CACHE_DIR = ".ocr_cache"  # Texto OCR guardado por hash del contenido de la imagen
+OCR_TARGET_DPI = 300  # Imágenes con bastante más resolución se reducen a esta antes del OCR
+MAX_OCR_WIDTH = 3500  # Sin DPI en el archivo: más ancho que una página a 300 DPI se reduce
+BINARIZE_THRESHOLD = None  # Umbral blanco/negro fijo (ej: 180); None = no binarizar
+
+# ========== PATRONES (precompilados) ==========
+# Se aplican sobre el texto ya normalizado (en minúsculas), por eso ninguno usa re.IGNORECASE
+_TOTAL_RE = re.compile(r"total[s]?[^\d]*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2}))")
+_NUMS_RE = re.compile(r"\d+(?:[.,]\d+)?")
+_DATE_RE = re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b")
+_META_RE = re.compile(
+    r"fecha|nit|ci|cliente|vendedor|firma|sello|condiciones|observaciones|iban|n°|factura"
+)
+_EN_LABEL_RE = re.compile(r"qty|net price|net worth|vat|gross")
+_VAT_PCT_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+_SIMPLE_RE = re.compile(r"(\d+)\s+[A-Za-zÁÉÍÓÚÑa-z]+\s+(\d+(?:[.,]\d+)?)\s+(\d+(?:[.,]\d+)?)")
+_VALOR_RE = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s+\w*\s*(\d+(?:[.,]\d+)?)\s+(\d+(?:[.,]\d+)?)\s+\d+%?\s+(\d+(?:[.,]\d+)?)"
+)
+# Lookahead: encuentra cada palabra clave en cada posición, aunque se solapen
+_DISPATCH_RE = re.compile(
+    r"(?=(base imponible|iva|precio neto|valor neto|cantidad|precio|importe|qty|net price))"
+)
+_BASE_RE = re.compile(r"base imponible[:\s]+([\d.,-]+)")
+_IVA_RE = re.compile(r"iva.*?:\s*([-]?\d+[.,]?\d*)")
+_IRPF_RE = re.compile(r"irpf.*?:\s*([-]?\d+[.,]?\d*)")
+
+# Errores comunes de OCR -> corrección (se aplican en una sola pasada)
+_REPLACEMENTS = {
+    "precioneto": "precio neto",
+    "valorneto": "valor neto",
+    "imporie": "importe",
+    "imporle": "importe",
+    "cantldad": "cantidad",
+    "totai": "total",
+}
+# Las primeras alternativas cubren correcciones que se solapan ("...neto"+"totai",
+# "totai"+"imporie"): un solo recorrido se comería la letra compartida
+_NORM_RE = re.compile(
+    r"(?:precione|valorne)?totaimpor[il]e|(?:precione|valorne)totai|"
+    + "|".join(map(re.escape, _REPLACEMENTS))
+)
+
+# Tabla para borrar €, signos + y cualquier espacio Unicode (lo mismo que [€\s+])
+_WHITESPACE = "".join(chr(c) for c in range(0x3001) if chr(c).isspace())
+_STRIP_TBL = str.maketrans("", "", "€+" + _WHITESPACE)
+
+
+# ========== CACHÉ OCR ==========
+def _image_hash(image_path: str) -> str:
+    """SHA-256 del contenido de la imagen (clave de la caché)"""
+    h = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    # el motor y el preprocesado cambian el texto OCR: no reutilizar resultados con otros ajustes
+    h.update(f"|{OCR_BACKEND}|{OCR_TARGET_DPI}|{MAX_OCR_WIDTH}|{BINARIZE_THRESHOLD}".encode())
+    return h.hexdigest()
+
+
+def _cache_path(digest: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, f"{digest}.txt")
+
+
+def _read_cache(digest: str) -> Optional[str]:
+    try:
+        with open(_cache_path(digest), encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_cache(digest: str, text: str) -> None:
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    with open(_cache_path(digest), "w", encoding="utf-8", newline="") as f:
+        f.write(text)
 
 
 # ========== OCR & LIMPIEZA ==========
-def extract_text(image_path: str) -> str:
-    """Extrae texto usando OCR de Tesseract"""
-    img = Image.open(image_path)
-    # Probar español + inglés para facturas mixtas
-    text = pytesseract.image_to_string(img, lang="spa+eng")
-    return text
+def _downscale_factor(img: Image.Image) -> float:
+    """Factor para llevar la imagen a ~OCR_TARGET_DPI (1.0 = dejarla igual)"""
+    dpi = img.info.get("dpi")
+    if dpi and dpi[0] > 0:
+        # margen del 10%: no recodificar una imagen que ya está casi a 300 DPI
+        if dpi[0] > OCR_TARGET_DPI * 1.1:
+            return OCR_TARGET_DPI / float(dpi[0])
+        return 1.0
+    if img.width > MAX_OCR_WIDTH:
+        # sin DPI: suponer una página de 8,5" (Carta, algo más ancha que A4)
+        return OCR_TARGET_DPI * 8.5 / img.width
+    return 1.0
+
+
+def needs_preprocess(image_path: str) -> bool:
+    """
+    Indica si vale la pena preprocesar la imagen. Si no, Tesseract abre el
+    archivo original directamente (sin decodificar y recodificar con PIL).
+    """
+    if BINARIZE_THRESHOLD is not None:
+        return True
+    with Image.open(image_path) as img:  # solo lee la cabecera
+        return _downscale_factor(img) < 1.0
+
+
+def preprocess_image(image_path: str) -> Image.Image:
+    """Escala de grises, reduce a ~300 DPI y binariza si se pidió (menos trabajo para Tesseract)"""
+    with Image.open(image_path) as src:
+        scale = _downscale_factor(src)
+        img = src.convert("L")
+    if scale < 1.0:
+        img = img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+        img.info["dpi"] = (OCR_TARGET_DPI, OCR_TARGET_DPI)
+    if BINARIZE_THRESHOLD is not None:
+        img = img.point(lambda p: 255 if p > BINARIZE_THRESHOLD else 0, mode="1")
+    return img
+
+
+def extract_texts(image_paths: List[str]) -> List[str]:
+    """
+    Extrae el texto de varias imágenes (preprocesadas solo si hace falta)
+    cargando Tesseract una sola vez. Con tesserocr se reutiliza un mismo
+    handle de la API para todo el lote; si no, se le pasa a tesseract.exe
+    un .txt con una ruta por línea y las páginas vuelven separadas por
+    salto de página (\\f), en el mismo orden.
+    """
+    if not image_paths:
+        return []
+
+    if PyTessBaseAPI is not None:
+        texts = []
+        with PyTessBaseAPI(lang="spa+eng") as api:
+            for path in image_paths:
+                if needs_preprocess(path):
+                    api.SetImage(preprocess_image(path))
+                else:
+                    api.SetImageFile(path)
+                texts.append(api.GetUTF8Text())
+        return texts
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Solo las imágenes preprocesadas se guardan en PNG; el resto va tal cual
+        img_paths = []
+        for i, path in enumerate(image_paths):
+            if needs_preprocess(path):
+                img_path = os.path.join(tmp, f"{i}.png")
+                img = preprocess_image(path)
+                # conservar la resolución para que Tesseract no tenga que adivinarla
+                if "dpi" in img.info:
+                    img.save(img_path, dpi=img.info["dpi"])
+                else:
+                    img.save(img_path)
+            else:
+                img_path = os.path.abspath(path)
+            img_paths.append(img_path)
+
+        list_path = os.path.join(tmp, "img_list.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(img_paths))
+        text = pytesseract.image_to_string(list_path, lang="spa+eng")
+
+    # Cada página termina en \f, así que el último trozo queda vacío
+    pages = text.split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    if len(pages) != len(image_paths):
+        # No adivinar qué texto es de qué imagen (ni guardarlo en la caché)
+        raise RuntimeError(
+            f"Tesseract devolvió {len(pages)} páginas para {len(image_paths)} imágenes"
+        )
+    return pages
+
+
+def _init_ocr_worker() -> None:
+    # Tesseract ya corre en paralelo por proceso; evitar que cada uno abra sus propios hilos
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def extract_texts_parallel(image_paths: List[str]) -> List[str]:
+    """
+    Reparte las imágenes en lotes, uno por núcleo, y hace el OCR de cada
+    lote en un proceso distinto. Devuelve los textos en el mismo orden.
+    """
+    if not image_paths:
+        return []
+
+    workers = min(os.cpu_count() or 1, len(image_paths))
+    size = -(-len(image_paths) // workers)  # división redondeando hacia arriba
+    batches = [image_paths[i:i + size] for i in range(0, len(image_paths), size)]
+
+    # Un solo lote: no vale la pena arrancar un proceso aparte
+    if len(batches) == 1:
+        return extract_texts(batches[0])
+
+    with multiprocessing.Pool(processes=len(batches), initializer=_init_ocr_worker) as pool:
+        results = pool.map(extract_texts, batches)
+    return [text for batch in results for text in batch]
+
+
+def extract_texts_cached(image_paths: List[str]) -> List[str]:
+    """
+    Igual que extract_texts_parallel, pero solo pasa por Tesseract las
+    imágenes cuyo contenido no está en la caché (y cada una una sola vez).
+    """
+    digests = [_image_hash(p) for p in image_paths]
+    texts = [_read_cache(d) for d in digests]
+
+    # Imágenes sin caché, agrupadas por contenido para no repetir el OCR
+    pending = {}
+    for i, (digest, text) in enumerate(zip(digests, texts)):
+        if text is None:
+            pending.setdefault(digest, []).append(i)
+
+    if pending:
+        todo = [image_paths[idx[0]] for idx in pending.values()]
+        for (digest, idx), text in zip(pending.items(), extract_texts_parallel(todo)):
+            _write_cache(digest, text)
+            for i in idx:
+                texts[i] = text
+    return texts
+
+
+def _fix_ocr_word(word: str) -> str:
+    """Aplica las correcciones en el mismo orden que la cadena de str.replace original"""
+    for wrong, right in _REPLACEMENTS.items():
+        word = word.replace(wrong, right)
+    return word
 
 
 def normalize_text(text: str) -> str:
     """Corrige errores comunes de OCR"""
-    replacements = {
-        "precioneto": "precio neto",
-        "valorneto": "valor neto",
-        "imporie": "importe",
-        "imporle": "importe",
-        "cantldad": "cantidad",
-        "totai": "total",
-    }
-    t = text.lower()
-    for wrong, right in replacements.items():
-        t = t.replace(wrong, right)
-    return t
+    return _NORM_RE.sub(lambda m: _fix_ocr_word(m.group(0)), text.lower())
 
 
 # ========== HELPERS ==========
 def parse_number(num: str) -> float:
     num = num.strip()
 
+    # Camino rápido: entero o decimal con punto que no puede ser separador de miles
+    if num.isascii():
+        if num.isdigit():
+            return float(num)
+        head, dot, tail = num.partition(".")
+        if dot and head.isdigit() and tail.isdigit() and len(tail) != 3:
+            return float(num)
+
     # Caso con coma y punto -> formato europeo
     if "," in num and "." in num:
         num = num.replace(".", "").replace(",", ".")
@@ -46,11 +273,14 @@ def parse_number(num: str) -> float:
         num = num.replace(",", ".")
     elif "." in num:
         # hay punto pero no coma -> probablemente separador de miles
-        if re.match(r"^\d{1,3}(\.\d{3})+$", num):  # ej: 1.451 o 12.345
+        # ej: 1.451 o 12.345 (1-3 dígitos y luego grupos de exactamente 3)
+        head, *groups = num.split(".")
+        if (1 <= len(head) <= 3 and head.isdecimal()
+                and all(len(g) == 3 and g.isdecimal() for g in groups)):
             num = num.replace(".", "")
         # si es decimal normal (ej: 1234.56), lo dejamos como está
     # eliminar símbolos de euro, espacios y signos +
-    num = re.sub(r"[€\s+]", "", num)
+    num = num.translate(_STRIP_TBL)
 
     return float(num)
 
@@ -60,97 +290,100 @@ def find_total(text: str) -> float:
     """
     Busca el total reportado en la factura (última coincidencia).
     Maneja formatos europeos (1.234,56) y estándar (1234.56).
+    Espera el texto ya normalizado (en minúsculas).
     """
-    matches = re.findall(r"total[s]?[^\d]*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2}))", text.lower())
-    if matches:
-        raw_total = matches[-1]
-        return parse_number(raw_total)
+    last = None
+    for m in _TOTAL_RE.finditer(text):
+        last = m
+    if last:
+        return parse_number(last.group(1))
     return None
 
 
 # ========== PROCESADORES ==========
 def process_invoice_any(text: str):
     """Método universal: intenta detectar patrones de cantidad-precio-importe"""
+    out = []
     lines = text.splitlines()
-    calculated_total = 0.0
+    rows = []  # (qty, price, total) por línea candidata
 
     for raw in lines:
-        line = raw.strip().lower()
+        line = raw.strip()
         if not line:
             continue
 
         # Ignorar metadatos y fechas
-        if any(x in line for x in [
-            "fecha", "nit", "ci", "cliente", "vendedor", "firma", "sello",
-            "condiciones", "observaciones", "iban", "n°", "factura"
-        ]):
+        if _META_RE.search(line):
             continue
 
         # ⚠️ ignorar formatos de fecha dd/mm/yyyy o similares
-        if re.search(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b", line):
+        if _DATE_RE.search(line):
             continue
 
         # Capturar números
-        nums = re.findall(r"\d+(?:[.,]\d+)?", line)
-        if len(nums) < 2:
+        nums = _NUMS_RE.findall(line)
+        if len(nums) < 3:
             continue
 
         # Intentar mapear a qty, price, total
         try:
-            if len(nums) >= 3:
-                qty = parse_number(nums[-3])
-                price = parse_number(nums[-2])
-                total = parse_number(nums[-1])
-
-                # ⚠️ Filtros adicionales para evitar falsos positivos
-                if total > 1000 and (qty < 10 and price < 100):
-                    continue
-
-                calc = qty * price
-                calculated_total += total
-                print(f"Linea: {qty} x {price} = {calc:.2f} | OCR Importe: {total:.2f} | "
-                      f"{'✔️' if abs(calc-total)<0.5 else '❌'}")
+            rows.append((parse_number(nums[-3]), parse_number(nums[-2]), parse_number(nums[-1])))
         except Exception:
             continue
 
+    # Verificar todas las líneas de una vez
+    calculated_total = 0.0
+    if rows:
+        vals = np.array(rows, dtype=np.float64)
+        qty, price, total = vals[:, 0], vals[:, 1], vals[:, 2]
+
+        # ⚠️ Filtros adicionales para evitar falsos positivos
+        vals = vals[~((total > 1000) & (qty < 10) & (price < 100))]
+
+        calcs = vals[:, 0] * vals[:, 1]
+        ok = np.abs(calcs - vals[:, 2]) < 0.5
+        calculated_total = float(vals[:, 2].sum())
+
+        for (qty, price, total), calc, good in zip(vals.tolist(), calcs.tolist(), ok.tolist()):
+            out.append(f"Linea: {qty} x {price} = {calc:.2f} | OCR Importe: {total:.2f} | "
+                       f"{'✔️' if good else '❌'}")
+
     # Comparar con total reportado
     reported = find_total(text)
     if reported is not None:
-        print(f"\nTOTAL OCR: {reported:.2f} | Calculado: {calculated_total:.2f} | "
-              f"{'✔️' if abs(reported-calculated_total)<1 else '❌'}")
+        out.append(f"\nTOTAL OCR: {reported:.2f} | Calculado: {calculated_total:.2f} | "
+                   f"{'✔️' if abs(reported-calculated_total)<1 else '❌'}")
     else:
-        print(f"\nTOTAL CALCULADO: {calculated_total:.2f}")
+        out.append(f"\nTOTAL CALCULADO: {calculated_total:.2f}")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def process_invoice_simple(text: str):
     """Factura con columnas Cantidad / Precio / Importe"""
+    out = []
     calculated_total = 0.0
-    pattern = re.compile(r"(\d+)\s+[A-Za-zÁÉÍÓÚÑa-z]+\s+(\d+(?:[.,]\d+)?)\s+(\d+(?:[.,]\d+)?)")
-
     for line in text.splitlines():
-        m = pattern.search(line)
+        m = _SIMPLE_RE.search(line)
         if m:
             qty = int(m.group(1))
             price = parse_number(m.group(2))
             total = parse_number(m.group(3))
             calc = qty * price
             calculated_total += total
-            print(f"Linea: {qty} x {price} = {calc:.2f} | OCR Importe: {total:.2f} | "
-                  f"{'✔️' if abs(calc-total)<0.5 else '❌'}")
+            out.append(f"Linea: {qty} x {price} = {calc:.2f} | OCR Importe: {total:.2f} | "
+                       f"{'✔️' if abs(calc-total)<0.5 else '❌'}")
 
-    print(f"\nTOTAL CALCULADO: {calculated_total:.2f}")
+    out.append(f"\nTOTAL CALCULADO: {calculated_total:.2f}")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def process_invoice_valor(text: str):
     """Factura con Precio Neto / Valor Neto / Valor Total"""
+    out = []
     calculated_total = 0.0
     calculated_iva = 0.0
-    pattern = re.compile(
-        r"(\d+(?:[.,]\d+)?)\s+\w*\s*(\d+(?:[.,]\d+)?)\s+(\d+(?:[.,]\d+)?)\s+\d+%?\s+(\d+(?:[.,]\d+)?)"
-    )
-
     for line in text.splitlines():
-        m = pattern.search(line)
+        m = _VALOR_RE.search(line)
         if m:
             qty = parse_number(m.group(1))
             precio_neto = parse_number(m.group(2))
@@ -161,11 +394,12 @@ def process_invoice_valor(text: str):
             calculated_total += valor_total
             calculated_iva += iva_linea
 
-            print(f"Linea: {qty} x {precio_neto} = {calc_valor_neto:.2f} | "
-                  f"OCR Valor Neto: {valor_neto:.2f} | IVA: {iva_linea:.2f} | "
-                  f"Valor Total: {valor_total:.2f}")
+            out.append(f"Linea: {qty} x {precio_neto} = {calc_valor_neto:.2f} | "
+                       f"OCR Valor Neto: {valor_neto:.2f} | IVA: {iva_linea:.2f} | "
+                       f"Valor Total: {valor_total:.2f}")
 
-    print(f"\nTOTAL CALCULADO: {calculated_total:.2f} | IVA CALCULADO: {calculated_iva:.2f}")
+    out.append(f"\nTOTAL CALCULADO: {calculated_total:.2f} | IVA CALCULADO: {calculated_iva:.2f}")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def process_invoice_en(text: str):
@@ -177,53 +411,49 @@ def process_invoice_en(text: str):
     gross = None
 
     lines = text.splitlines()
-    for i, line in enumerate(lines):
-        line_clean = line.strip().lower()
+    # Cada línea junto a la siguiente (la última se empareja con "")
+    for line, next_line in zip(lines, lines[1:] + [""]):
+        line_clean = line.strip()
 
-        # Qty → buscar después de "qty"
-        if "qty" in line_clean:
-            nums = re.findall(r"\d+(?:[.,]\d+)?", line + " " + (lines[i+1] if i+1 < len(lines) else ""))
-            if nums:
-                qty = parse_number(nums[0])
+        # Etiquetas presentes en la línea (una sola pasada)
+        labels = set(_EN_LABEL_RE.findall(line_clean))
+        if not labels:
+            continue
 
-        # Net price
-        if "net price" in line_clean:
-            nums = re.findall(r"\d+(?:[.,]\d+)?", line + " " + (lines[i+1] if i+1 < len(lines) else ""))
-            if nums:
+        # Números de esta línea y la siguiente, extraídos una sola vez
+        nums = _NUMS_RE.findall(line + " " + next_line)
+        if nums:
+            # Qty / Net price / Net worth → primer número tras la etiqueta
+            if "qty" in labels:
+                qty = parse_number(nums[0])
+            if "net price" in labels:
                 net_price = parse_number(nums[0])
-
-        # Net worth
-        if "net worth" in line_clean:
-            nums = re.findall(r"\d+(?:[.,]\d+)?", line + " " + (lines[i+1] if i+1 < len(lines) else ""))
-            if nums:
+            if "net worth" in labels:
                 net_worth = parse_number(nums[0])
+            # Gross worth → último número
+            if "gross" in labels:
+                gross = parse_number(nums[-1])
 
         # VAT %
-        if "vat" in line_clean and "%" in line_clean:
-            m_vat = re.search(r"(\d+(?:[.,]\d+)?)\s*%", line)
+        if "vat" in labels and "%" in line_clean:
+            m_vat = _VAT_PCT_RE.search(line)
             if m_vat:
                 vat_percent = float(m_vat.group(1))
 
-        # Gross worth
-        if "gross worth" in line_clean or "gross" in line_clean:
-            nums = re.findall(r"\d+(?:[.,]\d+)?", line + " " + (lines[i+1] if i+1 < len(lines) else ""))
-            if nums:
-                gross = parse_number(nums[-1])
-
     # Calcular valores
     calc_net = net_worth if net_worth else (qty * net_price if qty and net_price else 0)
     calc_vat = calc_net * vat_percent / 100 if vat_percent and calc_net else (gross - calc_net if gross and calc_net else 0)
     calc_total = calc_net + calc_vat
 
-    print("\n--- FACTURA EN (English) ---")
-    print(f"Qty: {qty}")
-    print(f"Net price: {net_price}")
-    print(f"Net worth: {net_worth}")
-    print(f"VAT (%): {vat_percent} → {calc_vat:.2f}")
-    print(f"Gross (OCR): {gross}")
-    print(f"TOTAL CALCULADO: {calc_total:.2f} | "
-          f"{'✔️' if gross and abs(calc_total - gross) < 1 else '❌'}")
-
+    out = ["\n--- FACTURA EN (English) ---"]
+    out.append(f"Qty: {qty}")
+    out.append(f"Net price: {net_price}")
+    out.append(f"Net worth: {net_worth}")
+    out.append(f"VAT (%): {vat_percent} → {calc_vat:.2f}")
+    out.append(f"Gross (OCR): {gross}")
+    out.append(f"TOTAL CALCULADO: {calc_total:.2f} | "
+               f"{'✔️' if gross and abs(calc_total - gross) < 1 else '❌'}")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def process_invoice_with_taxes(text: str):
@@ -234,30 +464,28 @@ def process_invoice_with_taxes(text: str):
     base = iva = irpf = reported_total = None
 
     # Buscar base imponible
-    m_base = re.search(r"base imponible[:\s]+([\d.,-]+)", text, re.IGNORECASE)
+    m_base = _BASE_RE.search(text)
     if m_base:
         base = parse_number(m_base.group(1))
 
     # Buscar IVA
-    m_iva = re.search(r"iva.*?:\s*([-]?\d+[.,]?\d*)", text, re.IGNORECASE)
+    m_iva = _IVA_RE.search(text)
     if m_iva:
         iva = parse_number(m_iva.group(1))
 
     # Buscar IRPF
-    m_irpf = re.search(r"irpf.*?:\s*([-]?\d+[.,]?\d*)", text, re.IGNORECASE)
+    m_irpf = _IRPF_RE.search(text)
     if m_irpf:
         irpf = parse_number(m_irpf.group(1))
 
     # Buscar TOTAL
-    m_total = re.findall(r"total[s]?[^\d]*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2}))", text.lower())
-    if m_total:
-        reported_total = parse_number(m_total[-1])
+    reported_total = find_total(text)
 
-    print("\n--- FACTURA CON IMPUESTOS ---")
-    print(f"Base imponible: {base}")
-    print(f"IVA: {iva}")
-    print(f"IRPF: {irpf}")
-    print(f"TOTAL OCR: {reported_total}")
+    out = ["\n--- FACTURA CON IMPUESTOS ---"]
+    out.append(f"Base imponible: {base}")
+    out.append(f"IVA: {iva}")
+    out.append(f"IRPF: {irpf}")
+    out.append(f"TOTAL OCR: {reported_total}")
 
     if base is not None:
         calc_total = base
@@ -266,32 +494,45 @@ def process_invoice_with_taxes(text: str):
         if irpf is not None:
             calc_total += irpf
 
-        print(f"TOTAL CALCULADO (Base+IVA+IRPF): {calc_total:.2f} | "
-              f"{'✔️' if reported_total and abs(calc_total - reported_total) < 1 else '❌'}")
+        out.append(f"TOTAL CALCULADO (Base+IVA+IRPF): {calc_total:.2f} | "
+                   f"{'✔️' if reported_total and abs(calc_total - reported_total) < 1 else '❌'}")
+
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 # ========== MAIN ==========
 def main():
-    for file in os.listdir(IMAGE_DIR):
-        if not file.lower().endswith((".png", ".jpg", ".jpeg")):
-            continue
+    files, paths = [], []
+    with os.scandir(IMAGE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith((".png", ".jpg", ".jpeg")):
+                files.append(entry.name)
+                paths.append(entry.path)
 
-        path = os.path.join(IMAGE_DIR, file)
+    # OCR en paralelo; el análisis posterior es barato y se hace aquí
+    raw_texts = extract_texts_cached(paths)
+
+    for file, raw_text in zip(files, raw_texts):
         print(f"\n=== Procesando {file} ===")
-        raw_text = extract_text(path)
         norm_text = normalize_text(raw_text)
         print("--- TEXTO OCR NORMALIZADO ---")
         print(norm_text)
 
-        if "base imponible" in norm_text and "iva" in norm_text:
+        # Palabras clave presentes, en una sola pasada. "precio neto" y "precio"
+        # empiezan en la misma posición y el lookahead solo reporta la primera
+        found = set(_DISPATCH_RE.findall(norm_text))
+        if "precio neto" in found:
+            found.add("precio")
+
+        if "base imponible" in found and "iva" in found:
             process_invoice_with_taxes(norm_text)
-        elif "precio neto" in norm_text and "valor neto" in norm_text:
+        elif "precio neto" in found and "valor neto" in found:
             print("\n--- FACTURA (Precio Neto / Valor Neto) ---")
             process_invoice_valor(norm_text)
-        elif "cantidad" in norm_text and "precio" in norm_text and "importe" in norm_text:
+        elif "cantidad" in found and "precio" in found and "importe" in found:
             print("\n--- FACTURA SIMPLE ---")
             process_invoice_simple(norm_text)
-        elif "qty" in norm_text or "net price" in norm_text:
+        elif "qty" in found or "net price" in found:
             print("\n--- FACTURA EN (English) ---")
             process_invoice_en(norm_text)
         else: